@@ -0,0 +1,10 @@
+-- Balances are deliberately not INCLUDEd: they change on every transaction
+-- and indexing them would rule out HOT updates of account rows.
+CREATE INDEX accounts_user_id_created_at_idx
+ON accounts (user_id, created_at DESC);
+
+CREATE INDEX transactions_from_account_id_created_at_idx
+ON transactions (from_account_id, created_at DESC);
+
+CREATE INDEX transactions_to_account_id_created_at_idx
+ON transactions (to_account_id, created_at DESC);
@@ -0,0 +1,11 @@
+-- Transaction history is paged by id, which grows in insertion order, so
+-- index each account column together with id instead of created_at.
+DROP INDEX transactions_from_account_id_created_at_idx;
+
+DROP INDEX transactions_to_account_id_created_at_idx;
+
+CREATE INDEX transactions_from_account_id_id_idx
+ON transactions (from_account_id, id DESC);
+
+CREATE INDEX transactions_to_account_id_id_idx
+ON transactions (to_account_id, id DESC);
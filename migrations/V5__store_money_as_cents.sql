@@ -0,0 +1,8 @@
+-- Store money as integer cents rather than decimal(15, 2).
+ALTER TABLE accounts
+ALTER COLUMN balance DROP DEFAULT,
+ALTER COLUMN balance TYPE bigint USING (balance * 100)::bigint,
+ALTER COLUMN balance SET DEFAULT 0;
+
+ALTER TABLE transactions
+ALTER COLUMN amount TYPE bigint USING (amount * 100)::bigint;
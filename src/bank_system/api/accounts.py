@@ -3,11 +3,11 @@
 from http import HTTPStatus
 from typing import Annotated
 
-import asyncpg
+import asyncpg  # noqa: TC002
 from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel
 
-from bank_system.core.auth import verify_credentials
+from bank_system.core.auth import get_user_id
 from bank_system.db import get_conn
 
 router = APIRouter(prefix="/accounts", tags=["accounts"])
@@ -17,37 +17,35 @@ class CreateAccountResponse(BaseModel):
     """Response model for an account."""
 
     id: int
-    balance: float
+    balance: int  # in cents
 
 
 # TODO(Mie): What error handling is needed here?
 # Up to how many accounts a user can have?
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def create_account(
-    username: Annotated[str, Depends(verify_credentials)],
-    conn: Annotated[asyncpg.Connection, Depends(get_conn)],
+    user_id: Annotated[int, Depends(get_user_id)],
+    conn: Annotated[asyncpg.Connection, Depends(get_conn, scope="function")],
 ) -> CreateAccountResponse:
     """Create a new account for a user."""
     row = await conn.fetchrow(
         """
         INSERT INTO accounts (user_id, balance)
-        SELECT id, 0
-        FROM users
-        WHERE username = $1
+        VALUES ($1, 0)
         RETURNING id, user_id, balance
         """,
-        username,
+        user_id,
     )
 
     assert row is not None
-    return CreateAccountResponse.model_validate(dict(row))
+    return CreateAccountResponse.model_construct(id=row["id"], balance=row["balance"])
 
 
 @router.get("/{account_id}", response_model=CreateAccountResponse)
 async def get_account(
     account_id: int,
-    username: Annotated[str, Depends(verify_credentials)],
-    conn: Annotated[asyncpg.Connection, Depends(get_conn)],
+    user_id: Annotated[int, Depends(get_user_id)],
+    conn: Annotated[asyncpg.Connection, Depends(get_conn, scope="function")],
 ) -> CreateAccountResponse:
     """Get account details by account ID."""
     row = await conn.fetchrow(
@@ -55,15 +53,10 @@ async def get_account(
         SELECT
             id, balance
         FROM accounts
-        WHERE id = $1
-        AND user_id = (
-            SELECT id
-            FROM users
-            WHERE username = $2
-        )
+        WHERE id = $1 AND user_id = $2
         """,
         account_id,
-        username,
+        user_id,
     )
 
     if row is None:
@@ -72,38 +65,30 @@ async def get_account(
             detail="Account not found",
         )
 
-    return CreateAccountResponse.model_validate(dict(row))
+    return CreateAccountResponse.model_construct(id=row["id"], balance=row["balance"])
 
 
 @router.get("/", response_model=list[CreateAccountResponse])
 async def get_accounts(
-    username: Annotated[str, Depends(verify_credentials)],
-    conn: Annotated[asyncpg.Connection, Depends(get_conn)],
+    user_id: Annotated[int, Depends(get_user_id)],
+    conn: Annotated[asyncpg.Connection, Depends(get_conn, scope="function")],
 ) -> list[CreateAccountResponse]:
-    """Get all accounts for a specific user."""
-    try:
-        rows = await conn.fetch(
-            """
-            SELECT id, user_id, balance
-            FROM accounts
-            WHERE user_id = (
-                SELECT id
-                FROM users
-                WHERE username = $1
-            )
-            ORDER BY created_at DESC
-            """,
-            username,
-        )
-    except asyncpg.NoDataFoundError as err:
-        raise HTTPException(
-            status_code=HTTPStatus.NOT_FOUND,
-            detail="User has no accounts",
-        ) from err
-    except asyncpg.ForeignKeyViolationError as err:
-        raise HTTPException(
-            status_code=HTTPStatus.BAD_REQUEST,
-            detail="Invalid user ID",
-        ) from err
+    """Get all accounts for a specific user.
+
+    Returns:
+        The user's accounts, newest first. Empty if the user has none.
+    """
+    rows = await conn.fetch(
+        """
+        SELECT id, user_id, balance
+        FROM accounts
+        WHERE user_id = $1
+        ORDER BY created_at DESC
+        """,
+        user_id,
+    )
 
-    return [CreateAccountResponse.model_validate(dict(row)) for row in rows]
+    return [
+        CreateAccountResponse.model_construct(id=row["id"], balance=row["balance"])
+        for row in rows
+    ]
@@ -1,10 +1,9 @@
 """Authentication endpoints."""
 
 from http import HTTPStatus
-from typing import Annotated
+from typing import Annotated, TypedDict, cast
 
-import asyncpg
-from asyncpg import Connection
+from asyncpg import Connection  # noqa: TC002
 from fastapi import APIRouter, Depends, HTTPException, status
 from loguru import logger
 from pydantic import BaseModel
@@ -22,23 +21,46 @@ class RegisterRequest(BaseModel):
     password: str
 
 
+class _RegisterRecord(TypedDict):
+    id: int
+    created: bool
+
+
 @router.post("/register", status_code=status.HTTP_201_CREATED)
 async def register(
-    request: RegisterRequest, conn: Annotated[Connection, Depends(get_conn)]
+    request: RegisterRequest,
+    conn: Annotated[Connection, Depends(get_conn, scope="function")],
 ) -> None:
     """Register a new user with username and password stored in memory."""
-    try:
-        _ = await conn.fetchrow(
-            "INSERT INTO users (username) VALUES ($1) RETURNING id",
+    record = cast(
+        _RegisterRecord | None,
+        await conn.fetchrow(
+            """
+            WITH inserted AS (
+                INSERT INTO users (username) VALUES ($1)
+                ON CONFLICT (username) DO NOTHING
+                RETURNING id
+            )
+            SELECT id, TRUE AS created FROM inserted
+            UNION ALL
+            SELECT id, FALSE AS created FROM users WHERE username = $1
+            LIMIT 1
+            """,
             request.username,
+        ),
+    )
+    if record is None:
+        # A concurrent request inserted the username after this statement's
+        # snapshot was taken, so neither branch sees the row
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST,
+            detail="Username already exists",
         )
-    except asyncpg.UniqueViolationError:
-        logger.warning(
-            "Username already exists. Reregistering user {}", request.username
-        )
+    if not record["created"]:
+        logger.debug("Username already exists. Reregistering user {}", request.username)
 
     try:
-        register_user(request.username, request.password)
+        await register_user(record["id"], request.username, request.password)
     except ValueError as err:
         raise HTTPException(
             status_code=HTTPStatus.BAD_REQUEST,
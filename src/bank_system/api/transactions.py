@@ -1,16 +1,16 @@
 """API endpoints for transaction operations."""
 
 from datetime import datetime
-from decimal import Decimal
 from http import HTTPStatus
 from typing import Annotated, NewType, TypedDict, cast
 
-from annotated_types import Gt
-from asyncpg import Connection  # noqa: TC002
-from fastapi import APIRouter, Depends, HTTPException
+from annotated_types import Gt, Le
+from asyncpg import Connection, Record  # noqa: TC002
+from fastapi import APIRouter, Depends, HTTPException, Path, Query
 from pydantic import BaseModel, Field, ValidationInfo, field_validator
+from pydantic.dataclasses import dataclass
 
-from bank_system.core.auth import verify_credentials
+from bank_system.core.auth import get_user_id, verify_credentials
 from bank_system.db import get_conn
 
 router = APIRouter(
@@ -20,28 +20,38 @@ router = APIRouter(
 )
 
 AccountId = NewType("AccountId", int)
+# Money is handled in integer minor units (cents) end to end
+Cents = NewType("Cents", int)
+# Amounts are bound as bigint
+_MAX_CENTS = 2**63 - 1
 
+# Ids are int4 columns, so anything bound against them has to fit in one
+_MAX_ID = 2**31 - 1
 
-class CreateDepositRequest(BaseModel):
+
+@dataclass
+class CreateDepositRequest:
     """Request model for creating deposit transaction."""
 
     account_id: AccountId
-    amount: Annotated[Decimal, Gt(0)]
+    amount: Annotated[Cents, Gt(0), Le(_MAX_CENTS)]
 
 
-class CreateWithdrawalRequest(BaseModel):
+@dataclass
+class CreateWithdrawalRequest:
     """Request model for creating withdrawal transaction."""
 
     account_id: AccountId
-    amount: Annotated[Decimal, Gt(0)]
+    amount: Annotated[Cents, Gt(0), Le(_MAX_CENTS)]
 
 
-class CreateTransferRequest(BaseModel):
+@dataclass
+class CreateTransferRequest:
     """Request model for creating a transfer transaction."""
 
     from_: Annotated[AccountId, Field(alias="from")]
     to: AccountId
-    amount: Annotated[Decimal, Gt(0)]
+    amount: Annotated[Cents, Gt(0), Le(_MAX_CENTS)]
 
     @field_validator("to", mode="after")
     @classmethod
@@ -53,19 +63,14 @@ class CreateTransferRequest(BaseModel):
         return to
 
 
-class _DepositRecord(TypedDict):
-    to_account_id: AccountId
-    to_account_balance: Decimal
-
-
 class _WithdrawalRecord(TypedDict):
     from_account_id: AccountId
-    from_account_balance: Decimal
+    from_account_balance: Cents | None
 
 
 class _TransferRecord(TypedDict):
     from_account_id: AccountId | None
-    from_account_balance: Decimal | None
+    from_account_balance: Cents | None
     to_account_id: AccountId | None
 
 
@@ -78,233 +83,350 @@ class Transaction(BaseModel):
     to_account_id: Annotated[
         AccountId | None, Field(alias="to", exclude_if=lambda x: x is None)
     ]
-    amount: Decimal
+    amount: Cents
     created_at: datetime
 
 
+class TransactionPage(BaseModel):
+    """Model representing one page of an account's transactions."""
+
+    items: list[Transaction]
+    next_before_id: int | None
+
+
+class AccountTransactionPage(TransactionPage):
+    """Model representing a page of transactions with the account's balance."""
+
+    balance: Cents
+
+
 @router.post(path="/deposit", status_code=HTTPStatus.CREATED)
 async def create_deposit(
     request: CreateDepositRequest,
-    username: Annotated[str, Depends(verify_credentials)],
-    conn: Annotated[Connection, Depends(get_conn)],
+    user_id: Annotated[int, Depends(get_user_id)],
+    conn: Annotated[Connection, Depends(get_conn, scope="function")],
 ) -> None:
     """Create a deposit transaction for an account."""
-    async with conn.transaction():
-        record = cast(
-            _DepositRecord | None,
-            await conn.fetchrow(
-                """
-                WITH check_to_account AS (
-                    SELECT 1
-                    FROM accounts AS a
-                    JOIN users AS u ON a.user_id = u.id
-                    WHERE a.id = $2 AND u.username = $4
-                ), deposit AS (
-                    UPDATE accounts
-                    SET balance = balance + $3
-                    WHERE id = $2 AND EXISTS (SELECT 1 FROM check_to_account)
-                    RETURNING id, balance
-                ), transaction AS (
-                    INSERT INTO transactions (from_account_id, to_account_id, amount)
-                    SELECT $1, $2, $3
-                    WHERE EXISTS (SELECT 1 FROM deposit)
-                    RETURNING id
-                )
-                SELECT
-                    deposit.id AS to_account_id,
-                    deposit.balance AS to_account_balance
-                FROM deposit
-                """,
-                None,
-                request.account_id,
-                request.amount,
-                username,
-            ),
+    # The INSERT inserts nothing when the UPDATE matched no account, so the
+    # command status alone tells whether the deposit happened
+    status = await conn.execute(
+        """
+        WITH deposit AS (
+            UPDATE accounts
+            SET balance = balance + $2
+            WHERE id = $1 AND user_id = $3
+            RETURNING id
+        )
+        INSERT INTO transactions (from_account_id, to_account_id, amount)
+        SELECT NULL, id, $2
+        FROM deposit
+        """,
+        request.account_id,
+        request.amount,
+        user_id,
+    )
+    if status == "INSERT 0 0":
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND, detail="Account not found"
         )
-        if record is None:
-            raise HTTPException(
-                status_code=HTTPStatus.NOT_FOUND, detail="Account not found"
-            )
 
 
 @router.post(path="/withdrawal", status_code=HTTPStatus.CREATED)
 async def create_withdrawal(
     request: CreateWithdrawalRequest,
-    username: Annotated[str, Depends(verify_credentials)],
-    conn: Annotated[Connection, Depends(get_conn)],
+    user_id: Annotated[int, Depends(get_user_id)],
+    conn: Annotated[Connection, Depends(get_conn, scope="function")],
 ) -> None:
     """Create a withdrawal transaction for an account."""
-    async with conn.transaction():
-        record = cast(
-            _WithdrawalRecord | None,
-            await conn.fetchrow(
-                """
-                WITH from_account_check AS (
-                    SELECT 1
-                    FROM accounts AS a
-                    JOIN users AS u ON a.user_id = u.id
-                    WHERE a.id = $1 AND u.username = $4
-                ),
-                withdrawal AS (
-                    UPDATE accounts
-                    SET balance = balance - $3
-                    WHERE id = $1 AND EXISTS (SELECT 1 FROM from_account_check)
-                    RETURNING id, balance
-                ), transaction AS (
-                    INSERT INTO transactions (from_account_id, to_account_id, amount)
-                    SELECT $1, $2, $3
-                    WHERE EXISTS (SELECT 1 FROM withdrawal)
-                    RETURNING id
-                )
-                SELECT
-                    withdrawal.id AS from_account_id,
-                    withdrawal.balance AS from_account_balance
+    record = cast(
+        _WithdrawalRecord | None,
+        await conn.fetchrow(
+            """
+            WITH withdrawal AS (
+                UPDATE accounts
+                SET balance = balance - $2
+                WHERE id = $1 AND user_id = $3 AND balance >= $2
+                RETURNING id, balance
+            ), transaction AS (
+                INSERT INTO transactions (from_account_id, to_account_id, amount)
+                SELECT id, NULL, $2
                 FROM withdrawal
-                """,
-                request.account_id,
-                None,
-                request.amount,
-                username,
-            ),
-        )
-        if record is None:
-            raise HTTPException(
-                status_code=HTTPStatus.NOT_FOUND, detail="Account not found"
+                RETURNING id
             )
+            SELECT
+                a.id AS from_account_id,
+                withdrawal.balance AS from_account_balance
+            FROM accounts AS a
+            LEFT JOIN withdrawal ON TRUE
+            WHERE a.id = $1 AND a.user_id = $3
+            """,
+            request.account_id,
+            request.amount,
+            user_id,
+        ),
+    )
+    if record is None:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND, detail="Account not found"
+        )
 
-        if record["from_account_balance"] < 0:
-            raise HTTPException(
-                status_code=HTTPStatus.BAD_REQUEST,
-                detail="Insufficient funds in this account",
-            )
+    if record["from_account_balance"] is None:
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST,
+            detail="Insufficient funds in this account",
+        )
 
 
-# TODO(Mie): Figure out how writing with multiple statements could result in deadlocks
-# depending on isolation level.
 @router.post(path="/transfer", status_code=HTTPStatus.CREATED)
 async def create_transfer(
     request: CreateTransferRequest,
-    username: Annotated[str, Depends(verify_credentials)],
-    conn: Annotated[Connection, Depends(get_conn)],
+    user_id: Annotated[int, Depends(get_user_id)],
+    conn: Annotated[Connection, Depends(get_conn, scope="function")],
 ) -> None:
     """Create a transfer transaction between two accounts.
 
     Returns:
         A mapping of transfer types to their respective transfer transactions.
     """
-    async with conn.transaction():
-        record = cast(
-            _TransferRecord | None,
-            await conn.fetchrow(
-                """
-                WITH from_account_check AS (
-                    SELECT 1
-                    FROM accounts AS a
-                    JOIN users AS u ON a.user_id = u.id
-                    WHERE a.id = $1 AND u.username = $4)
-                , withdrawal AS (
-                    UPDATE accounts
-                    SET balance = balance - $3
-                    WHERE id = $1 AND EXISTS (SELECT 1 FROM from_account_check)
-                    RETURNING id, balance
-                ), deposit AS (
-                    UPDATE accounts
-                    SET balance = balance + $3
-                    WHERE id = $2
-                    RETURNING id
-                ), transaction AS (
-                    INSERT INTO transactions (from_account_id, to_account_id, amount)
-                    SELECT $1, $2, $3
-                    WHERE EXISTS (SELECT 1 FROM withdrawal)
-                    AND EXISTS (SELECT 1 FROM deposit)
-                    RETURNING id
-                )
-                SELECT
-                    withdrawal.id AS from_account_id,
-                    withdrawal.balance AS from_account_balance,
-                    deposit.id AS to_account_id
-                FROM withdrawal
-                FULL JOIN deposit ON TRUE
-                """,
-                request.from_,
-                request.to,
-                request.amount,
-                username,
-            ),
-        )
-
-        if record is None:
-            raise HTTPException(
-                status_code=HTTPStatus.NOT_FOUND,
-                detail="From account and to account not found",
+    record = cast(
+        _TransferRecord,
+        await conn.fetchrow(
+            """
+            WITH locked_accounts AS (
+                SELECT id, user_id, balance
+                FROM accounts
+                WHERE id IN ($1, $2)
+                ORDER BY id
+                FOR UPDATE
+            ), from_account AS (
+                SELECT id, balance
+                FROM locked_accounts
+                WHERE id = $1 AND user_id = $4
+            ), to_account AS (
+                SELECT id
+                FROM locked_accounts
+                WHERE id = $2
+            ), transfer AS (
+                UPDATE accounts
+                SET balance = accounts.balance + delta.amount
+                FROM (
+                    VALUES ($1::int, -$3::bigint), ($2, $3)
+                ) AS delta (id, amount)
+                WHERE accounts.id = delta.id
+                AND EXISTS (SELECT 1 FROM from_account WHERE balance >= $3)
+                AND EXISTS (SELECT 1 FROM to_account)
+                RETURNING accounts.id, accounts.balance
+            ), transaction AS (
+                INSERT INTO transactions (from_account_id, to_account_id, amount)
+                SELECT $1, $2, $3
+                WHERE EXISTS (SELECT 1 FROM transfer)
+                RETURNING id
             )
+            SELECT
+                (SELECT id FROM from_account) AS from_account_id,
+                (
+                    SELECT balance FROM transfer WHERE id = $1
+                ) AS from_account_balance,
+                (SELECT id FROM to_account) AS to_account_id
+            """,
+            request.from_,
+            request.to,
+            request.amount,
+            user_id,
+        ),
+    )
 
-        if record.get("from_account_id") is None:
-            raise HTTPException(
-                status_code=HTTPStatus.NOT_FOUND,
-                detail="From account not found",
-            )
-        if record.get("to_account_id") is None:
-            raise HTTPException(
-                status_code=HTTPStatus.NOT_FOUND,
-                detail="To account not found",
-            )
-        from_balance = record.get("from_account_balance")
-        if from_balance is not None and from_balance < 0:
-            raise HTTPException(
-                status_code=HTTPStatus.BAD_REQUEST,
-                detail="Insufficient funds in from account",
-            )
+    if record["from_account_id"] is None and record["to_account_id"] is None:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND,
+            detail="From account and to account not found",
+        )
+    if record["from_account_id"] is None:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND,
+            detail="From account not found",
+        )
+    if record["to_account_id"] is None:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND,
+            detail="To account not found",
+        )
+    if record["from_account_balance"] is None:
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST,
+            detail="Insufficient funds in from account",
+        )
 
 
 @router.get("/account/{account_id}")
 async def get_transactions_by_account(
-    account_id: int,
-    username: Annotated[str, Depends(verify_credentials)],
-    conn: Annotated[Connection, Depends(get_conn)],
-) -> list[Transaction]:
-    """Get all transactions for a specific account."""
+    account_id: Annotated[int, Path(gt=0, le=_MAX_ID)],
+    user_id: Annotated[int, Depends(get_user_id)],
+    conn: Annotated[Connection, Depends(get_conn, scope="function")],
+    before_id: Annotated[int | None, Query(gt=0, le=_MAX_ID)] = None,
+    limit: Annotated[int, Query(gt=0, le=200)] = 50,
+) -> AccountTransactionPage:
+    """Get a page of transactions for a specific account, newest first.
+
+    The account's current balance comes back with the page. Pass the returned
+    ``next_before_id`` as ``before_id`` to fetch the next page.
+    """
+    # Each side of the UNION ALL is a bounded backwards scan of its index, so a
+    # page costs the same however long the account's history is. Joining the
+    # page onto the account yields no rows if the account isn't the caller's,
+    # and a single all-NULL row if it has no transactions.
+    # Without before_id the bound is one past the largest possible id, bound as
+    # bigint since it doesn't fit in an int4.
     records = await conn.fetch(
         """
-        SELECT
-            from_account_id AS from,
-            to_account_id AS to,
-            amount,
-            created_at
-        FROM transactions
-        WHERE (from_account_id = $1 OR to_account_id = $1)
-        AND EXISTS (
-            SELECT 1
-            FROM accounts AS a
-            JOIN users AS u ON a.user_id = u.id
-            WHERE a.id = $1 AND u.username = $2
+        WITH account AS (
+            SELECT id, balance FROM accounts WHERE id = $1 AND user_id = $2
+        ), page AS (
+            SELECT *
+            FROM (
+                (
+                    SELECT * FROM transactions
+                    WHERE from_account_id = $1 AND id < $3::bigint
+                    ORDER BY id DESC
+                    LIMIT $4
+                )
+                UNION ALL
+                (
+                    SELECT * FROM transactions
+                    WHERE to_account_id = $1 AND id < $3::bigint
+                    ORDER BY id DESC
+                    LIMIT $4
+                )
+            ) AS t
+            WHERE EXISTS (SELECT 1 FROM account)
+            ORDER BY id DESC
+            LIMIT $4
         )
-        ORDER BY created_at DESC
+        SELECT
+            account.balance,
+            page.id,
+            page.from_account_id AS from,
+            page.to_account_id AS to,
+            page.amount,
+            page.created_at
+        FROM account
+        LEFT JOIN page ON TRUE
+        ORDER BY page.id DESC
         """,
         account_id,
-        username,
+        user_id,
+        _MAX_ID + 1 if before_id is None else before_id,
+        limit,
     )
 
     if not records:
-        account_exists = cast(
-            int | None,
-            await conn.fetchval(
-                """
-                SELECT 1
-                FROM accounts AS a
-                JOIN users AS u ON a.user_id = u.id
-                WHERE a.id = $1
-                AND u.username = $2
-                """,
-                account_id,
-                username,
-            ),
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND,
+            detail="Account not found",
         )
+    balance = cast(Cents, records[0]["balance"])
+    if records[0]["id"] is None:
+        records = []
+
+    return AccountTransactionPage.model_construct(
+        items=_transactions(records),
+        next_before_id=_next_before_id(records, limit),
+        balance=balance,
+    )
+
+
+@router.get("/")
+async def get_transactions_by_accounts(
+    account_ids: Annotated[
+        list[Annotated[int, Field(gt=0, le=_MAX_ID)]],
+        Query(min_length=1, max_length=100),
+    ],
+    user_id: Annotated[int, Depends(get_user_id)],
+    conn: Annotated[Connection, Depends(get_conn, scope="function")],
+    before_id: Annotated[int | None, Query(gt=0, le=_MAX_ID)] = None,
+    limit: Annotated[int, Query(gt=0, le=200)] = 50,
+) -> TransactionPage:
+    """Get a page of transactions across several accounts, newest first.
+
+    A transfer between two of the given accounts is listed once. Pass the
+    returned ``next_before_id`` as ``before_id`` to fetch the next page.
+    """
+    unique_account_ids = list(set(account_ids))
+    # Same shape as get_transactions_by_account: no rows unless every account
+    # is the caller's, and a single all-NULL row if none has transactions.
+    # Each listed account gets its own pair of bounded index scans, since
+    # Postgres can't walk the indexes in id order for an = ANY predicate, and
+    # DISTINCT ON lists a transfer between two of the accounts once.
+    records = await conn.fetch(
+        """
+        WITH owned AS (
+            SELECT count(*) AS n
+            FROM accounts
+            WHERE id = ANY($1::int[]) AND user_id = $2
+        ), page AS (
+            SELECT DISTINCT ON (t.id) t.*
+            FROM unnest($1::int[]) AS listed (account_id)
+            CROSS JOIN LATERAL (
+                (
+                    SELECT * FROM transactions
+                    WHERE from_account_id = listed.account_id AND id < $3::bigint
+                    ORDER BY id DESC
+                    LIMIT $4
+                )
+                UNION ALL
+                (
+                    SELECT * FROM transactions
+                    WHERE to_account_id = listed.account_id AND id < $3::bigint
+                    ORDER BY id DESC
+                    LIMIT $4
+                )
+            ) AS t
+            WHERE (SELECT n FROM owned) = cardinality($1)
+            ORDER BY t.id DESC
+            LIMIT $4
+        )
+        SELECT
+            page.id,
+            page.from_account_id AS from,
+            page.to_account_id AS to,
+            page.amount,
+            page.created_at
+        FROM owned
+        LEFT JOIN page ON TRUE
+        WHERE owned.n = cardinality($1)
+        ORDER BY page.id DESC
+        """,
+        unique_account_ids,
+        user_id,
+        _MAX_ID + 1 if before_id is None else before_id,
+        limit,
+    )
+
+    if not records:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND,
+            detail="Account not found",
+        )
+    if records[0]["id"] is None:
+        records = []
+
+    return TransactionPage.model_construct(
+        items=_transactions(records),
+        next_before_id=_next_before_id(records, limit),
+    )
+
+
+def _transactions(records: list[Record]) -> list[Transaction]:
+    return [
+        Transaction.model_construct(
+            from_account_id=record["from"],
+            to_account_id=record["to"],
+            amount=record["amount"],
+            created_at=record["created_at"],
+        )
+        for record in records
+    ]
 
-        if account_exists is None:
-            raise HTTPException(
-                status_code=HTTPStatus.NOT_FOUND,
-                detail="Account not found",
-            )
 
-    return [Transaction.model_validate(dict(record)) for record in records]
+def _next_before_id(records: list[Record], limit: int) -> int | None:
+    return records[-1]["id"] if len(records) == limit else None
@@ -3,11 +3,11 @@
 from http import HTTPStatus
 from typing import Annotated
 
-from asyncpg import Connection
+import asyncpg  # noqa: TC002
 from fastapi import APIRouter, Depends, HTTPException
 
-from bank_system.core.auth import verify_credentials
-from bank_system.db import get_conn
+from bank_system.core.auth import is_registered, verify_credentials
+from bank_system.db import get_pool
 
 router = APIRouter(
     prefix="/users", tags=["users"], dependencies=[Depends(verify_credentials)]
@@ -17,10 +17,15 @@ router = APIRouter(
 # TODO(Mie): What error handling is needed here?
 @router.get("/{username}")
 async def get_user(
-    username: str, conn: Annotated[Connection, Depends(get_conn)]
+    username: str, pool: Annotated[asyncpg.Pool, Depends(get_pool)]
 ) -> None:
     """Check if a user exists by username."""
-    row = await conn.fetchrow(
+    # Users registered since startup are all in memory; only users from
+    # before a restart need the database
+    if is_registered(username):
+        return
+
+    row = await pool.fetchrow(
         "SELECT 1 FROM users WHERE username = $1",
         username,
     )
@@ -1,29 +1,92 @@
 """Authentication utilities for the bank system API."""
 
-from typing import Annotated
+import asyncio
+import hashlib
+import hmac
+import time
+from collections import OrderedDict
+from collections.abc import Generator  # noqa: TC003
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import cache
+from typing import Annotated, NamedTuple
 
 import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 
+from bank_system.core.config import get_settings
+
 security = HTTPBasic()
 
-# In-memory user storage (username -> hashed_password)
+# bcrypt releases the GIL while hashing, so a thread pool of its own keeps
+# password checks off the event loop without competing with FastAPI's
+# shared threadpool for workers
+_bcrypt_executor = ThreadPoolExecutor(thread_name_prefix="bcrypt")
+
+
+class _User(NamedTuple):
+    id: int
+    hashed_password: str
+
+
+# In-memory user storage (username -> user ID and hashed_password)
 # Data will be cleared when the app restarts
-_users: dict[str, str] = {}
+_users: dict[str, _User] = {}
+
+# HTTP Basic sends the password on every request, so remember recent successful
+# checks to skip bcrypt for repeat clients (username -> SHA-256 of the verified
+# password and when it was verified)
+_AUTH_CACHE_TTL = 60.0
+_AUTH_CACHE_MAX_SIZE = 1024
+_auth_cache: OrderedDict[str, tuple[bytes, float]] = OrderedDict()
 
 
 def clear_users():
     """Clear in-memory user storage."""
     _users.clear()
+    _auth_cache.clear()
+
+
+@contextmanager
+def preserve_users() -> Generator[None]:
+    """Restore in-memory user storage to its current contents on exit."""
+    users = _users.copy()
+    auth_cache = _auth_cache.copy()
+    try:
+        yield
+    finally:
+        clear_users()
+        _users.update(users)
+        _auth_cache.update(auth_cache)
+
+
+def is_registered(username: str) -> bool:
+    """Check whether a username is in the in-memory user storage."""
+    return username in _users
 
 
 def hash_password(password: str) -> str:
     """Hash a password using bcrypt."""
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=get_settings().bcrypt_rounds)
     return bcrypt.hashpw(password.encode("utf-8"), salt).decode("utf-8")
 
 
+@cache
+def _dummy_hash(rounds: int) -> bytes:
+    return bcrypt.hashpw(b"dummy", bcrypt.gensalt(rounds=rounds))
+
+
+def _verify_dummy_password(plain_password: str) -> None:
+    """Check a password against a dummy hash with the same work factor.
+
+    Used for unknown usernames, so a miss takes as long as a real check.
+    """
+    bcrypt.checkpw(
+        plain_password.encode("utf-8"), _dummy_hash(get_settings().bcrypt_rounds)
+    )
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
     return bcrypt.checkpw(
@@ -32,24 +95,33 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     )
 
 
-def register_user(username: str, password: str) -> None:
+async def register_user(user_id: int, username: str, password: str) -> None:
     """Register a new user in memory.
 
+    The password is hashed on the bcrypt executor, off the event loop.
+
     Args:
+        user_id: The ID of the user's row in the database.
         username: The username to register.
         password: The plain text password.
 
     Raises:
         ValueError: If username already exists.
     """
+    msg = "Username already exists"
     if username in _users:
-        msg = "Username already exists"
         raise ValueError(msg)
 
-    _users[username] = hash_password(password)
+    hashed_password = await asyncio.get_running_loop().run_in_executor(
+        _bcrypt_executor, hash_password, password
+    )
+    # Another registration for the same username may have finished meanwhile
+    user = _User(id=user_id, hashed_password=hashed_password)
+    if _users.setdefault(username, user) is not user:
+        raise ValueError(msg)
 
 
-def verify_credentials(
+async def verify_credentials(
     credentials: Annotated[HTTPBasicCredentials, Depends(security)],
 ) -> str:
     """Verify HTTP Basic Auth credentials.
@@ -65,21 +137,51 @@ def verify_credentials(
     """
     username = credentials.username
     password = credentials.password
+    loop = asyncio.get_running_loop()
 
     if username not in _users:
         # User not found - hash a dummy password to prevent timing attacks
-        bcrypt.checkpw(b"dummy", bcrypt.gensalt())
+        await loop.run_in_executor(_bcrypt_executor, _verify_dummy_password, password)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Basic"},
         )
 
-    if not verify_password(password, _users[username]):
+    digest = hashlib.sha256(password.encode("utf-8")).digest()
+    cached = _auth_cache.get(username)
+    if (
+        cached is not None
+        and hmac.compare_digest(cached[0], digest)
+        and time.monotonic() - cached[1] < _AUTH_CACHE_TTL
+    ):
+        _auth_cache.move_to_end(username)
+        return username
+
+    if not await loop.run_in_executor(
+        _bcrypt_executor, verify_password, password, _users[username].hashed_password
+    ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Basic"},
         )
 
+    _auth_cache[username] = (digest, time.monotonic())
+    _auth_cache.move_to_end(username)
+    if len(_auth_cache) > _AUTH_CACHE_MAX_SIZE:
+        _auth_cache.popitem(last=False)
+
     return username
+
+
+async def get_user_id(username: Annotated[str, Depends(verify_credentials)]) -> int:
+    """Get the database ID of the authenticated user.
+
+    The ID is recorded at registration, so endpoints can filter by
+    ``user_id`` without looking the username up in the database.
+
+    Returns:
+        The authenticated user's ID.
+    """
+    return _users[username].id
@@ -5,6 +5,7 @@ all API routers for users, accounts, and transactions.
 """
 
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 
 from bank_system.api.accounts import router as accounts_router
 from bank_system.api.auth import router as auth_router
@@ -12,16 +13,25 @@ from bank_system.api.transactions import router as transactions_router
 from bank_system.api.users import router as user_router
 from bank_system.db import lifespan
 
-app = FastAPI(redirect_slashes=False, lifespan=lifespan)
 
+def create_app() -> FastAPI:
+    """Build the application with all routers included."""
+    app = FastAPI(
+        redirect_slashes=False,
+        lifespan=lifespan,
+        default_response_class=ORJSONResponse,
+    )
 
-@app.get("/health")
-def health():
-    """Health check endpoint."""
-    return {"ok": True}
+    @app.get("/health")
+    def health():
+        """Health check endpoint."""
+        return {"ok": True}
 
+    app.include_router(auth_router)
+    app.include_router(user_router)
+    app.include_router(accounts_router)
+    app.include_router(transactions_router)
+    return app
 
-app.include_router(auth_router)
-app.include_router(user_router)
-app.include_router(accounts_router)
-app.include_router(transactions_router)
+
+app = create_app()
@@ -1,18 +1,30 @@
+import base64
 import os
 import shutil
 import subprocess
+from dataclasses import dataclass
+from http import HTTPStatus
 from typing import TYPE_CHECKING, cast
 
 import pytest
+from httpx import ASGITransport, AsyncClient
 from testing.postgresql import (  # pyright: ignore[reportMissingTypeStubs]
     Postgresql,
     PostgresqlFactory,
 )
 
-from bank_system.db import lifespan
+from bank_system.core.auth import preserve_users
+from bank_system.db import get_conn, get_pool, lifespan
+from bank_system.main import create_app
+
+# Cheapest bcrypt work factor; the tests don't need hashes to be slow to crack
+os.environ["BANK_BCRYPT_ROUNDS"] = "4"
 
 if TYPE_CHECKING:
-    from collections.abc import Callable
+    from collections.abc import AsyncIterator, Callable, Iterator
+
+    import asyncpg
+    from fastapi import FastAPI
 
 
 @pytest.fixture(scope="session")
@@ -20,6 +32,24 @@ def anyio_backend() -> str:
     return "asyncio"
 
 
+@pytest.fixture(scope="session")
+def app() -> FastAPI:
+    # Same construction as the deployed app, so response class and routing
+    # behave as in production. The lifespan is entered by the database fixture.
+    return create_app()
+
+
+@pytest.fixture(scope="session")
+def transport(app: FastAPI) -> ASGITransport:
+    return ASGITransport(app=app)
+
+
+@pytest.fixture(scope="session")
+async def unauthed_client(transport: ASGITransport) -> AsyncIterator[AsyncClient]:
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        yield ac
+
+
 @pytest.fixture(scope="session")
 def database_factory(pytestconfig: pytest.Config) -> Callable[[], Postgresql]:
     def run_migrations(db: Postgresql):
@@ -52,11 +82,85 @@ def database_factory(pytestconfig: pytest.Config) -> Callable[[], Postgresql]:
     return PostgresqlFactory(cache_initialized_db=True, on_initialized=run_migrations)
 
 
-@pytest.fixture(autouse=True)
-async def database(database_factory: Callable[[], Postgresql]):
+@pytest.fixture(scope="session")
+def postgresql(database_factory: Callable[[], Postgresql]) -> Iterator[Postgresql]:
     pg = database_factory()
     os.environ["BANK_DATABASE_URL"] = pg.url()  # pyright: ignore[reportUnknownMemberType]
     print(pg.url())  # pyright: ignore[reportUnknownMemberType] # noqa: T201
-    async with lifespan():
-        yield pg
+    yield pg
     pg.stop()
+
+
+@pytest.fixture(scope="session")
+async def database(postgresql: Postgresql, app: FastAPI) -> AsyncIterator[Postgresql]:
+    async with lifespan(app):
+        yield postgresql
+
+
+@pytest.fixture(autouse=True)
+async def db_transaction(
+    database: Postgresql,  # noqa: ARG001
+    app: FastAPI,
+) -> AsyncIterator[asyncpg.pool.PoolConnectionProxy]:
+    # Run every request of the test on one connection, inside a transaction
+    # that is rolled back afterwards, so tests don't see each other's rows.
+    # Endpoints that query through the pool get the connection as well; it
+    # has the same query methods. Tests can request this fixture to reach
+    # the connection directly.
+    pool: asyncpg.Pool = app.state.pool
+    async with pool.acquire() as conn:
+        transaction = conn.transaction()
+        await transaction.start()
+
+        async def get_test_conn() -> AsyncIterator[asyncpg.pool.PoolConnectionProxy]:
+            yield conn
+
+        async def get_test_pool() -> asyncpg.pool.PoolConnectionProxy:
+            return conn
+
+        app.dependency_overrides[get_conn] = get_test_conn
+        app.dependency_overrides[get_pool] = get_test_pool
+        # The in-memory user store isn't covered by the rollback, so restore
+        # it too: users a test registers are gone along with their rows
+        with preserve_users():
+            yield conn
+        del app.dependency_overrides[get_pool]
+        del app.dependency_overrides[get_conn]
+        await transaction.rollback()
+
+
+@dataclass
+class UserCredentials:
+    username: str
+    password: str
+
+
+@pytest.fixture(scope="session")
+async def created_user(
+    database: Postgresql,  # noqa: ARG001
+    unauthed_client: AsyncClient,
+) -> UserCredentials:
+    # Registered once, outside the per-test transactions, so every test can
+    # authenticate as this user
+    username = "testuser"
+    password = "testpass"  # noqa: S105
+    response = await unauthed_client.post(
+        "/auth/register", json={"username": username, "password": password}
+    )
+    assert response.status_code == HTTPStatus.CREATED
+    return UserCredentials(username=username, password=password)
+
+
+@pytest.fixture(scope="session")
+async def client(
+    transport: ASGITransport, created_user: UserCredentials
+) -> AsyncIterator[AsyncClient]:
+    token = base64.b64encode(
+        f"{created_user.username}:{created_user.password}".encode()
+    ).decode()
+    async with AsyncClient(
+        transport=transport,
+        base_url="http://test",
+        headers={"Authorization": f"Basic {token}"},
+    ) as ac:
+        yield ac
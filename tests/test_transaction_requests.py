@@ -0,0 +1,55 @@
+import pytest
+from pydantic import TypeAdapter, ValidationError
+
+from bank_system.api.transactions import (
+    CreateDepositRequest,
+    CreateTransferRequest,
+    CreateWithdrawalRequest,
+)
+
+# Validation-only tests: the request models are checked directly, without an
+# HTTP round-trip, the database or an event loop
+
+INVALID_AMOUNTS = [
+    pytest.param(-5000, id="negative"),
+    pytest.param(0, id="zero"),
+    pytest.param(2**63, id="too_large"),
+]
+
+
+@pytest.fixture(autouse=True)
+def db_transaction() -> None:
+    # Nothing here touches the database, so skip the per-test transaction
+    pass
+
+
+@pytest.mark.parametrize("amount", INVALID_AMOUNTS)
+def test__create_deposit__invalid_amount(amount: int) -> None:
+    with pytest.raises(ValidationError):
+        _ = TypeAdapter(CreateDepositRequest).validate_python(
+            {"account_id": 1, "amount": amount}
+        )
+
+
+@pytest.mark.parametrize("amount", INVALID_AMOUNTS)
+def test__create_withdrawal__invalid_amount(amount: int) -> None:
+    with pytest.raises(ValidationError):
+        _ = TypeAdapter(CreateWithdrawalRequest).validate_python(
+            {"account_id": 1, "amount": amount}
+        )
+
+
+@pytest.mark.parametrize(
+    ("same_account", "amount"),
+    [
+        pytest.param(False, -3000, id="negative"),
+        pytest.param(False, 0, id="zero"),
+        pytest.param(False, 2**63, id="too_large"),
+        pytest.param(True, 5000, id="same_account"),
+    ],
+)
+def test__create_transfer__invalid_request(*, same_account: bool, amount: int) -> None:
+    with pytest.raises(ValidationError):
+        _ = TypeAdapter(CreateTransferRequest).validate_python(
+            {"from": 1, "to": 1 if same_account else 2, "amount": amount}
+        )